@@ -2,15 +2,19 @@
 
 from __future__ import annotations
 
+import threading
 from dataclasses import dataclass, field
-from typing import List, Sequence
+from typing import Callable, List, Optional, Sequence
 
-from openai import APIError, OpenAI, RateLimitError, Timeout
-from rich.console import Console
+from openai import APIError, OpenAI
 
-from .config import Settings, settings
+from .config import Settings, get_http_client, settings
 from .vector_store import RetrievedChunk, VectorStore
 
+# The system messages open every request unchanged so OpenAI's prompt cache, which matches
+# exact prefixes, can reuse them; any edit to SYSTEM_PROMPT or CITATION_INSTRUCTIONS starts a
+# fresh cache. Per-turn content (retrieved context, the question) only appears in the final
+# user message.
 SYSTEM_PROMPT = """
 You are a calm, empathetic companion representing the scholarship of Dr. B. R. Ambedkar.
 Speak in clear, accessible English while staying faithful to the cited writings. Meet disagreement
@@ -19,7 +23,15 @@ into the material rather than dismissing other viewpoints. Avoid moralizing; gui
 logic, historical detail, and compassion.
 """.strip()
 
-console = Console()
+CITATION_INSTRUCTIONS = (
+    "You have access to excerpts from Dr. Ambedkar's writings. Cite them naturally in plain language "
+    "using the volume file name and page number when they inform your answer."
+)
+
+REPLY_INSTRUCTIONS = (
+    "Craft a thoughtful reply that references the context when relevant, acknowledges the user's perspective, "
+    "and suggests concrete ways to explore Ambedkar's work further."
+)
 
 
 @dataclass
@@ -27,11 +39,32 @@ class Chatbot:
     cfg: Settings = field(default_factory=settings)
     _client: OpenAI = field(init=False)
     _store: VectorStore = field(init=False)
+    _base_messages: List[dict[str, str]] = field(init=False)
 
     def __post_init__(self) -> None:
         self.cfg.ensure_api_key()
-        self._client = OpenAI(api_key=self.cfg.openai_api_key)
+        self._client = OpenAI(
+            api_key=self.cfg.openai_api_key,
+            http_client=get_http_client(),
+            max_retries=self.cfg.openai_max_retries,
+        )
         self._store = VectorStore(self.cfg)
+        self._base_messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "system", "content": CITATION_INSTRUCTIONS},
+        ]
+        # Daemon thread: a slow warm-up must never hold up interpreter exit.
+        threading.Thread(target=self._warm_up, daemon=True).start()
+
+    def _warm_up(self) -> None:
+        # Open the shared keep-alive connection (TLS handshake included) before the first
+        # question; the query embedding request reuses it too. One short attempt, as it is only
+        # an optimisation.
+        try:
+            client = self._client.with_options(max_retries=0, timeout=5.0)
+            client.models.retrieve(self.cfg.completion_model)
+        except APIError:  # pragma: no cover - best effort only
+            pass
 
     def _format_context(self, contexts: Sequence[RetrievedChunk]) -> str:
         if not contexts:
@@ -51,46 +84,40 @@ class Chatbot:
         question: str,
         history: Sequence[dict[str, str]] | None = None,
         top_k: int | None = None,
+        on_token: Optional[Callable[[str], None]] = None,
     ) -> tuple[str, List[RetrievedChunk]]:
-        contexts = self._store.similarity_search(question, top_k=top_k)
-        context_prompt = self._format_context(contexts)
-
-        messages: List[dict[str, str]] = [
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {
-                "role": "system",
-                "content": (
-                    "You have access to excerpts from Dr. Ambedkar's writings. Cite them naturally in plain language "
-                    "using the volume file name and page number when they inform your answer."
-                ),
-            },
-        ]
-        if history:
-            messages.extend(history)
+        """Answer ``question``, streaming the completion and passing each text delta to ``on_token``."""
 
+        contexts = self._store.similarity_search(question, top_k=top_k)
+        messages: List[dict[str, str]] = [*self._base_messages, *(history or ())]
         user_prompt = (
-            f"{context_prompt}\n\n"  # retrieval context first
+            f"{self._format_context(contexts)}\n\n"  # retrieval context first
             f"Conversation partner: {question}\n\n"
-            "Craft a thoughtful reply that references the context when relevant, acknowledges the user's perspective, "
-            "and suggests concrete ways to explore Ambedkar's work further."
+            f"{REPLY_INSTRUCTIONS}"
         )
         messages.append({"role": "user", "content": user_prompt})
 
-        for attempt in range(5):
-            try:
-                response = self._client.chat.completions.create(
-                    model=self.cfg.completion_model,
-                    temperature=self.cfg.persona_temperature,
-                    messages=messages,
-                )
-                answer = response.choices[0].message.content or ""
-                return answer.strip(), list(contexts)
-            except (RateLimitError, Timeout):  # pragma: no cover - network variability
-                wait_time = min(2 ** attempt, 30)
-                console.print(f"[yellow]Rate limited. Retrying in {wait_time}s...")
-            except APIError as exc:  # pragma: no cover - defensive
-                raise RuntimeError(f"OpenAI API error: {exc}") from exc
-        raise RuntimeError("Failed to generate a response after multiple attempts.")
+        parts: List[str] = []
+        try:
+            stream = self._client.chat.completions.create(
+                model=self.cfg.completion_model,
+                temperature=self.cfg.persona_temperature,
+                messages=messages,
+                stream=True,
+            )
+            for event in stream:
+                if not event.choices:
+                    continue
+                delta = event.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    if on_token is not None:
+                        on_token(delta)
+        except APIError as exc:  # pragma: no cover - defensive
+            if parts:
+                raise RuntimeError(f"The response stream was interrupted: {exc}") from exc
+            raise RuntimeError(f"OpenAI API error: {exc}") from exc
+        return "".join(parts).strip(), list(contexts)
 
 
 __all__ = ["Chatbot"]
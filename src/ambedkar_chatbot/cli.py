@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import shutil
 from typing import Optional
 
 import typer
@@ -9,7 +10,15 @@ from rich.console import Console
 from rich.panel import Panel
 
 from .chat import Chatbot
-from .config import INDEX_FILE, INDEX_INFO_FILE, METADATA_FILE
+from .config import (
+    CHUNK_CACHE_DIR,
+    INDEX_FILE,
+    INDEX_INFO_FILE,
+    METADATA_BLOB_FILE,
+    METADATA_FILE,
+    METADATA_OFFSETS_FILE,
+    VECTORS_FILE,
+)
 from .ingest import ingest_corpus
 
 app = typer.Typer(help="Utilities for preparing and conversing with the Ambedkar chatbot.")
@@ -23,14 +32,31 @@ def ingest(
         "--rebuild/--incremental",
         help="Rebuild the vector store from scratch (default) or append new material.",
     ),
+    batch_api: bool = typer.Option(
+        False,
+        "--batch-api",
+        help=(
+            "Embed through the OpenAI Batch API: about half the cost, but jobs run one after "
+            "another and each can take hours. Rerunning resumes jobs already submitted."
+        ),
+    ),
+    clear_cache: bool = typer.Option(
+        False,
+        "--clear-cache",
+        help="Discard cached PDF text chunks and re-extract every PDF.",
+    ),
 ) -> None:
-    """Parse PDFs, create embeddings, and build the Annoy index."""
+    """Parse PDFs, create embeddings, and build the vector index."""
 
     if not rebuild and not INDEX_FILE.exists():
         console.print("[yellow]No existing index detected; performing a full rebuild instead.")
         rebuild = True
 
-    ingest_corpus(rebuild=rebuild)
+    if clear_cache and CHUNK_CACHE_DIR.exists():
+        shutil.rmtree(CHUNK_CACHE_DIR)
+        console.print("[yellow]Cleared cached PDF chunks.")
+
+    ingest_corpus(rebuild=rebuild, use_batch_api=batch_api)
 
 
 @app.command()
@@ -70,11 +96,21 @@ def chat(top_k: Optional[int] = typer.Option(None, help="Override the number of
             console.print("[cyan]Conversation ended by user.")
             break
 
-        answer, contexts = bot.answer(normalized, history=history, top_k=top_k)
+        console.print("[bold cyan]Ambedkar Companion:[/] ", end="")
+        try:
+            answer, contexts = bot.answer(
+                normalized,
+                history=history,
+                top_k=top_k,
+                on_token=lambda token: console.out(token, end="", highlight=False),
+            )
+        except RuntimeError as exc:
+            console.print(f"\n[red]{exc}")
+            continue
+        console.print("\n")
         history.append({"role": "user", "content": normalized})
         history.append({"role": "assistant", "content": answer})
 
-        console.print(Panel(answer, title="Ambedkar Companion", border_style="cyan"))
         if contexts:
             console.print("[bold]Supporting references:[/]")
             for item in contexts:
@@ -90,7 +126,10 @@ def info() -> None:
 
     artefacts = {
         "Index": INDEX_FILE,
-        "Metadata": METADATA_FILE,
+        "Metadata": METADATA_BLOB_FILE,
+        "Offsets": METADATA_OFFSETS_FILE,
+        "JSONL": METADATA_FILE,
+        "Vectors": VECTORS_FILE,
         "Info": INDEX_INFO_FILE,
     }
     rows = []
@@ -2,13 +2,16 @@
 
 from __future__ import annotations
 
+import importlib.util
 import os
 from dataclasses import dataclass
 from functools import lru_cache
 from pathlib import Path
 from typing import Optional
 
+import httpx
 from dotenv import load_dotenv
+from openai import DefaultHttpxClient
 
 
 load_dotenv()
@@ -18,7 +21,15 @@ DATA_DIR = PROJECT_ROOT / "data"
 PDF_DIR = PROJECT_ROOT / "Ambedkar_Writings"
 INDEX_FILE = DATA_DIR / "ambedkar_index.ann"
 METADATA_FILE = DATA_DIR / "ambedkar_metadata.jsonl"
+METADATA_OFFSETS_FILE = DATA_DIR / "ambedkar_metadata.offsets"
+METADATA_BLOB_FILE = DATA_DIR / "ambedkar_metadata.blob"
 INDEX_INFO_FILE = DATA_DIR / "ambedkar_index_info.json"
+VECTORS_FILE = DATA_DIR / "ambedkar_vectors.npy"
+EMBED_CHECKPOINT_FILE = DATA_DIR / "embedding_checkpoint.jsonl"
+QUERY_CACHE_FILE = DATA_DIR / "query_embeddings.npz"
+CHUNK_CACHE_DIR = DATA_DIR / "cache"
+
+HTTP_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
 
 
 @dataclass(frozen=True)
@@ -27,11 +38,28 @@ class Settings:
 
     openai_api_key: Optional[str] = os.getenv("OPENAI_API_KEY")
     embedding_model: str = os.getenv("EMBED_MODEL", "text-embedding-3-small")
+    # Truncated (Matryoshka) embedding size for text-embedding-3 models; 0 keeps the native
+    # dimension. Other models always return their native size.
+    embedding_dimensions: int = int(os.getenv("EMBED_DIMENSIONS", "512"))
     completion_model: str = os.getenv("CHAT_MODEL", "gpt-4o-mini")
-    chunk_size: int = int(os.getenv("CHUNK_SIZE", "320"))  # number of words per chunk
-    chunk_overlap: int = int(os.getenv("CHUNK_OVERLAP", "60"))  # word overlap between chunks
+    chunk_size: int = int(os.getenv("CHUNK_SIZE", "512"))  # number of tokens per chunk
+    chunk_overlap: int = int(os.getenv("CHUNK_OVERLAP", "64"))  # token overlap between chunks
+    extract_workers: int = int(os.getenv("EXTRACT_WORKERS", "0"))  # PDF extraction processes; 0 uses every core
     batch_size: int = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+    max_concurrency: int = int(os.getenv("EMBED_MAX_CONCURRENCY", "8"))  # in-flight embedding requests
+    # Rate limits for the embeddings endpoint; 0 means "probe the API for the account limits".
+    max_requests_per_minute: int = int(os.getenv("EMBED_MAX_RPM", "0"))
+    max_tokens_per_minute: int = int(os.getenv("EMBED_MAX_TPM", "0"))
+    batch_api_max_chunks: int = int(os.getenv("BATCH_API_MAX_CHUNKS", "50000"))  # chunks per Batch API job
+    index_backend: str = os.getenv("INDEX_BACKEND", "hnsw")  # "hnsw" or "annoy"
+    # Also write the legacy JSONL metadata next to the memory-mapped blob/offset files.
+    write_jsonl_metadata: bool = os.getenv("METADATA_JSONL", "0").lower() in {"1", "true", "yes"}
+    query_cache_size: int = int(os.getenv("QUERY_CACHE_SIZE", "1024"))  # cached query embeddings; 0 disables
+    vector_quantization: str = os.getenv("VECTOR_QUANT", "int8")  # re-ranking vectors: "int8" or "none"
+    rerank_factor: int = int(os.getenv("RERANK_FACTOR", "4"))  # ANN candidates fetched per result for exact re-ranking
     top_k: int = int(os.getenv("TOP_K", "6"))
+    # Retries are handled by the OpenAI SDK, which backs off with jitter and honours Retry-After.
+    openai_max_retries: int = int(os.getenv("OPENAI_MAX_RETRIES", "5"))
     persona_temperature: float = float(os.getenv("CHAT_TEMPERATURE", "0.6"))
 
     def ensure_api_key(self) -> str:
@@ -43,6 +71,14 @@ class Settings:
             )
         return self.openai_api_key
 
+    @property
+    def requested_dimensions(self) -> int:
+        """Embedding size to request, or 0 when the model cannot truncate its vectors."""
+
+        if self.embedding_model.startswith("text-embedding-3") and self.embedding_dimensions > 0:
+            return self.embedding_dimensions
+        return 0
+
 
 @lru_cache(maxsize=1)
 def settings() -> Settings:
@@ -52,13 +88,35 @@ def settings() -> Settings:
     return Settings()
 
 
+@lru_cache(maxsize=1)
+def get_http_client() -> httpx.Client:
+    """Shared HTTP client so every OpenAI client reuses one keep-alive connection pool.
+
+    HTTP/2 is enabled when the optional ``h2`` package is installed.
+    """
+
+    return DefaultHttpxClient(
+        http2=importlib.util.find_spec("h2") is not None,
+        timeout=HTTP_TIMEOUT,
+        limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+    )
+
+
 __all__ = [
     "Settings",
     "settings",
+    "get_http_client",
     "PROJECT_ROOT",
     "DATA_DIR",
     "PDF_DIR",
     "INDEX_FILE",
     "METADATA_FILE",
+    "METADATA_OFFSETS_FILE",
+    "METADATA_BLOB_FILE",
     "INDEX_INFO_FILE",
+    "VECTORS_FILE",
+    "EMBED_CHECKPOINT_FILE",
+    "QUERY_CACHE_FILE",
+    "CHUNK_CACHE_DIR",
+    "HTTP_TIMEOUT",
 ]
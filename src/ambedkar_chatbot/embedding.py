@@ -1,57 +1,374 @@
-"""Wrapper around the OpenAI embeddings API with batching and retry logic."""
+"""Wrapper around the OpenAI embeddings API with batching and rate limiting."""
 
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import tempfile
+import threading
 import time
-from typing import Iterable, List, Sequence
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence
 
-from openai import APIError, OpenAI, RateLimitError, Timeout
+import numpy as np
+import orjson
+from openai import APIError, AsyncOpenAI, OpenAI
 
-from .config import Settings, settings
+from .config import HTTP_TIMEOUT, Settings, get_http_client, settings
+
+# Fallback budgets used when the rate-limit probe does not report account limits.
+_DEFAULT_RPM = 500
+_DEFAULT_TPM = 1_000_000
+
+_BATCH_POLL_SECONDS = 30
+_BATCH_FINAL_STATES = {"completed", "failed", "expired", "cancelled"}
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    # Unit-length rows turn cosine similarity into a plain inner product.
+    vectors /= np.linalg.norm(vectors, axis=-1, keepdims=True).clip(min=1e-12)
+    return vectors
+
+
+def _estimate_tokens(batch: Sequence[str]) -> int:
+    # Roughly four characters per token for English prose; good enough for budgeting.
+    return sum(len(text) for text in batch) // 4 + len(batch)
+
+
+class _RateLimiter:
+    """Token bucket that keeps concurrent requests within per-minute request and token budgets."""
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int) -> None:
+        self._rpm = float(requests_per_minute)
+        self._tpm = float(tokens_per_minute)
+        self._requests = self._rpm
+        self._tokens = self._tpm
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self._rpm, self._requests + elapsed * self._rpm / 60)
+        self._tokens = min(self._tpm, self._tokens + elapsed * self._tpm / 60)
+
+    async def acquire(self, tokens: int) -> None:
+        # A single oversized request must still be admitted once the bucket is full.
+        tokens = min(tokens, int(self._tpm))
+        while True:
+            self._refill()
+            if self._requests >= 1 and self._tokens >= tokens:
+                self._requests -= 1
+                self._tokens -= tokens
+                return
+            await asyncio.sleep(0.05)
 
 
 class EmbeddingClient:
-    """Thin wrapper that batches embeddings and retries rate-limited calls."""
+    """Thin wrapper that batches embeddings; retries are left to the OpenAI SDK.
 
-    def __init__(self, cfg: Settings | None = None) -> None:
+    All vectors are returned L2-normalised as float32.
+
+    Bulk embedding issues up to ``cfg.max_concurrency`` requests at once, from one background
+    event loop and async client, while a token bucket keeps them inside the account's rate
+    limits; call :meth:`close` when done. When ``checkpoint`` is given, every completed
+    batch (and every submitted Batch API job) is appended to it so an interrupted ingest can
+    resume without re-embedding.
+    """
+
+    def __init__(self, cfg: Settings | None = None, checkpoint: Path | None = None) -> None:
         self.cfg = cfg or settings()
-        api_key = self.cfg.ensure_api_key()
-        self.client = OpenAI(api_key=api_key)
+        self._api_key = self.cfg.ensure_api_key()
+        self.client = OpenAI(
+            api_key=self._api_key,
+            http_client=get_http_client(),
+            max_retries=self.cfg.openai_max_retries,
+        )
+        self.checkpoint = checkpoint
+        self._limiter: Optional[_RateLimiter] = None
+        self._resume: Optional[Dict[str, int]] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._async_client: Optional[AsyncOpenAI] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _probe_rate_limits(self) -> tuple[int, int]:
+        rpm = self.cfg.max_requests_per_minute
+        tpm = self.cfg.max_tokens_per_minute
+        if rpm and tpm:
+            return rpm, tpm
+        try:
+            raw = self.client.embeddings.with_raw_response.create(
+                model=self.cfg.embedding_model,
+                input="a",
+            )
+            rpm = rpm or int(raw.headers.get("x-ratelimit-limit-requests", 0))
+            tpm = tpm or int(raw.headers.get("x-ratelimit-limit-tokens", 0))
+        except (APIError, ValueError):  # pragma: no cover - network variability
+            pass
+        return rpm or _DEFAULT_RPM, tpm or _DEFAULT_TPM
+
+    def _request_options(self) -> dict:
+        # text-embedding-3 models can return Matryoshka-truncated vectors directly; older models
+        # reject the parameter.
+        if self.cfg.requested_dimensions:
+            return {"dimensions": self.cfg.requested_dimensions}
+        return {}
+
+    def _batch_key(self, batch: Sequence[str]) -> str:
+        digest = hashlib.sha1(
+            f"{self.cfg.embedding_model}:{self.cfg.requested_dimensions}".encode("utf-8")
+        )
+        for text in batch:
+            digest.update(b"\0")
+            digest.update(text.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _read_checkpoint(self) -> Iterator[tuple[int, dict]]:
+        # Yields each intact record with the byte offset of its line.
+        if self.checkpoint is None or not self.checkpoint.exists():
+            return
+        with self.checkpoint.open("rb") as fh:
+            offset = 0
+            for line in fh:
+                try:
+                    yield offset, orjson.loads(line)
+                except orjson.JSONDecodeError:  # torn write from a crash
+                    pass
+                offset += len(line)
+
+    def _load_checkpoint(self) -> Dict[str, int]:
+        # Only the offsets stay in memory; vectors are read back when their batch comes up.
+        resume: Dict[str, int] = {}
+        for offset, record in self._read_checkpoint():
+            if "vectors" in record:  # Batch API job records carry a ``batch_id`` instead
+                resume[record["key"]] = offset
+        return resume
+
+    def _resumed_vectors(self, key: str) -> Optional[List[List[float]]]:
+        assert self._resume is not None
+        offset = self._resume.pop(key, None)
+        if offset is None or self.checkpoint is None:
+            return None
+        with self.checkpoint.open("rb") as fh:
+            fh.seek(offset)
+            return orjson.loads(fh.readline())["vectors"]
+
+    def _write_checkpoint(self, key: str, **fields: object) -> None:
+        if self.checkpoint is None:
+            return
+        with self.checkpoint.open("ab") as fh:
+            fh.write(orjson.dumps({"key": key, **fields}))
+            fh.write(b"\n")
+
+    def _event_loop(self) -> asyncio.AbstractEventLoop:
+        # One loop, running on a daemon thread, serves every bulk call so the async client's
+        # connection pool and the concurrency budget persist across calls.
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            self._loop_thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+            self._loop_thread.start()
+        return self._loop
+
+    async def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        assert self._limiter is not None
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(
+                api_key=self._api_key,
+                max_retries=self.cfg.openai_max_retries,
+                timeout=HTTP_TIMEOUT,
+            )
+            self._semaphore = asyncio.Semaphore(max(self.cfg.max_concurrency, 1))
+        assert self._semaphore is not None
+        async with self._semaphore:
+            await self._limiter.acquire(_estimate_tokens(batch))
+            try:
+                response = await self._async_client.embeddings.create(
+                    model=self.cfg.embedding_model,
+                    input=batch,
+                    **self._request_options(),
+                )
+            except APIError as exc:  # pragma: no cover - defensive
+                raise RuntimeError(f"OpenAI API error while embedding: {exc}") from exc
+            vectors = [item.embedding for item in response.data]
+            self._write_checkpoint(self._batch_key(batch), vectors=vectors)
+            return vectors
+
+    async def _embed_batches(
+        self,
+        batches: List[List[str]],
+        results: List[Optional[List[List[float]]]],
+    ) -> np.ndarray:
+        pending = [idx for idx, vectors in enumerate(results) if vectors is None]
+        fetched = await asyncio.gather(*(self._embed_batch(batches[idx]) for idx in pending))
+        for idx, vectors in zip(pending, fetched):
+            results[idx] = vectors
+
+        embeddings: Optional[np.ndarray] = None
+        start = 0
+        for vectors in results:
+            rows = np.asarray(vectors, dtype=np.float32)
+            if embeddings is None:
+                total = sum(len(batch) for batch in batches)
+                embeddings = np.empty((total, rows.shape[1]), dtype=np.float32)
+            embeddings[start : start + len(rows)] = rows
+            start += len(rows)
+        assert embeddings is not None
+        return _normalize(embeddings)
+
+    def submit_texts(self, texts: Sequence[str]) -> Future:
+        """Start embedding ``texts`` on the background loop; the future yields their array.
+
+        Successive calls share one connection pool and one concurrency budget, so a caller that
+        submits the next batch of texts before collecting the previous one keeps every request
+        slot busy.
+        """
 
-    def embed_texts(self, texts: Sequence[str]) -> List[List[float]]:
         if not texts:
-            return []
-        embeddings: List[List[float]] = []
+            done: Future = Future()
+            done.set_result(np.empty((0, 0), dtype=np.float32))
+            return done
+        if self._limiter is None:
+            self._limiter = _RateLimiter(*self._probe_rate_limits())
+        if self._resume is None:
+            self._resume = self._load_checkpoint()
+
         batch_size = self.cfg.batch_size
-        for start in range(0, len(texts), batch_size):
-            batch = texts[start : start + batch_size]
-            attempt = 0
-            while True:
-                try:
-                    response = self.client.embeddings.create(
-                        model=self.cfg.embedding_model,
-                        input=list(batch),
-                    )
-                except (RateLimitError, Timeout) as exc:  # pragma: no cover - network timing
-                    delay = min(2 ** attempt, 30)
-                    time.sleep(delay)
-                    attempt += 1
-                    if attempt > 5:
-                        raise RuntimeError(
-                            "Repeated rate limit errors while requesting embeddings"
-                        ) from exc
-                    continue
-                except APIError as exc:  # pragma: no cover - defensive
-                    raise RuntimeError(f"OpenAI API error while embedding: {exc}") from exc
-                embeddings.extend([item.embedding for item in response.data])
-                break
-        return embeddings
-
-    def embed_query(self, text: str) -> List[float]:
-        vectors = self.embed_texts([text])
-        if not vectors:
+        batches = [list(texts[start : start + batch_size]) for start in range(0, len(texts), batch_size)]
+        results: List[Optional[List[List[float]]]] = [
+            self._resumed_vectors(self._batch_key(batch)) for batch in batches
+        ]
+        return asyncio.run_coroutine_threadsafe(self._embed_batches(batches, results), self._event_loop())
+
+    def embed_texts(self, texts: Sequence[str]) -> np.ndarray:
+        """Embed ``texts`` into a C-contiguous ``(len(texts), dim)`` float32 array."""
+
+        return self.submit_texts(texts).result()
+
+    def close(self) -> None:
+        """Close the async client and stop the background event loop, if they were started."""
+
+        if self._loop is None:
+            return
+        if self._async_client is not None:
+            asyncio.run_coroutine_threadsafe(self._async_client.close(), self._loop).result()
+            self._async_client = None
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        assert self._loop_thread is not None
+        self._loop_thread.join()
+        self._loop.close()
+        self._loop = None
+        self._loop_thread = None
+
+    def _resumable_batch_job(self, key: str) -> Optional[str]:
+        # The most recent job submitted for these texts, unless it can no longer complete.
+        batch_ids = [
+            record["batch_id"]
+            for _, record in self._read_checkpoint()
+            if record.get("key") == key and "batch_id" in record
+        ]
+        if not batch_ids:
+            return None
+        job = self.client.batches.retrieve(batch_ids[-1])
+        if job.status in _BATCH_FINAL_STATES and job.status != "completed":
+            return None
+        return job.id
+
+    def _submit_batch_job(self, texts: Sequence[str]) -> str:
+        batch_size = self.cfg.batch_size
+        with tempfile.NamedTemporaryFile("wb", suffix=".jsonl", delete=False) as fh:
+            for start in range(0, len(texts), batch_size):
+                request = {
+                    "custom_id": str(start),
+                    "method": "POST",
+                    "url": "/v1/embeddings",
+                    "body": {
+                        "model": self.cfg.embedding_model,
+                        "input": list(texts[start : start + batch_size]),
+                        **self._request_options(),
+                    },
+                }
+                fh.write(orjson.dumps(request))
+                fh.write(b"\n")
+            request_path = Path(fh.name)
+        try:
+            with request_path.open("rb") as fh:
+                upload = self.client.files.create(file=fh, purpose="batch")
+        finally:
+            request_path.unlink(missing_ok=True)
+        job = self.client.batches.create(
+            input_file_id=upload.id,
+            endpoint="/v1/embeddings",
+            completion_window="24h",
+        )
+        return job.id
+
+    def _wait_for_batch_job(self, batch_id: str) -> bytes:
+        job = self.client.batches.retrieve(batch_id)
+        while job.status not in _BATCH_FINAL_STATES:
+            time.sleep(_BATCH_POLL_SECONDS)
+            job = self.client.batches.retrieve(job.id)
+        if job.status != "completed" or not job.output_file_id:
+            raise RuntimeError(f"Embedding batch {job.id} finished with status {job.status!r}")
+        return self.client.files.content(job.output_file_id).content
+
+    def embed_texts_batch(self, texts: Sequence[str]) -> np.ndarray:
+        """Embed ``texts`` through the OpenAI Batch API.
+
+        Costs roughly half of the synchronous endpoint and is not bound by its rate limits, but
+        blocks until the job completes, which can take hours. The job id is checkpointed, so a
+        rerun over the same texts resumes waiting on the submitted job instead of paying twice.
+        """
+
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        key = self._batch_key(texts)
+        try:
+            batch_id = self._resumable_batch_job(key)
+            if batch_id is None:
+                batch_id = self._submit_batch_job(texts)
+                self._write_checkpoint(key, batch_id=batch_id)
+            output = self._wait_for_batch_job(batch_id)
+        except APIError as exc:  # pragma: no cover - defensive
+            raise RuntimeError(f"OpenAI API error while running embedding batch: {exc}") from exc
+
+        embeddings: Optional[np.ndarray] = None
+        filled = 0
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            record = orjson.loads(line)
+            response = record.get("response") or {}
+            if response.get("status_code") != 200:
+                raise RuntimeError(
+                    f"Embedding batch request {record['custom_id']} failed: "
+                    f"{record.get('error') or response.get('body')}"
+                )
+            data = sorted(response["body"]["data"], key=lambda item: item["index"])
+            rows = np.asarray([item["embedding"] for item in data], dtype=np.float32)
+            if embeddings is None:
+                embeddings = np.empty((len(texts), rows.shape[1]), dtype=np.float32)
+            start = int(record["custom_id"])
+            embeddings[start : start + len(rows)] = rows
+            filled += len(rows)
+        if embeddings is None or filled != len(texts):
+            raise RuntimeError("Embedding batch returned an incomplete set of vectors.")
+        return _normalize(embeddings)
+
+    def embed_query(self, text: str) -> np.ndarray:
+        try:
+            response = self.client.embeddings.create(
+                model=self.cfg.embedding_model,
+                input=[text],
+                **self._request_options(),
+            )
+        except APIError as exc:  # pragma: no cover - defensive
+            raise RuntimeError(f"OpenAI API error while embedding: {exc}") from exc
+        if not response.data:
             raise RuntimeError("Failed to compute embedding for query")
-        return vectors[0]
+        return _normalize(np.asarray(response.data[0].embedding, dtype=np.float32))
 
 
 __all__ = ["EmbeddingClient"]
@@ -2,22 +2,36 @@
 
 from __future__ import annotations
 
+import glob
+import hashlib
+import os
 import re
-from dataclasses import dataclass
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import asdict, dataclass
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
-from typing import Iterator, List
+from typing import Deque, Iterator, List, Optional, Set
 
+import hnswlib
+import numpy as np
 import orjson
+import tiktoken
 from annoy import AnnoyIndex
 from rich.console import Console
 
 from .config import (
+    CHUNK_CACHE_DIR,
     DATA_DIR,
+    EMBED_CHECKPOINT_FILE,
     INDEX_FILE,
     INDEX_INFO_FILE,
+    METADATA_BLOB_FILE,
     METADATA_FILE,
+    METADATA_OFFSETS_FILE,
     PDF_DIR,
+    VECTORS_FILE,
     Settings,
     settings,
 )
@@ -25,6 +39,12 @@ from .embedding import EmbeddingClient
 
 console = Console()
 
+_INDEX_BACKENDS = ("hnsw", "annoy")
+_VECTOR_QUANTIZATIONS = ("int8", "none")
+_TOKENIZER = "cl100k_base"
+_CACHE_DIGEST_LENGTH = 16
+_WHITESPACE = re.compile(r"\s+")
+
 
 @dataclass
 class Chunk:
@@ -37,24 +57,32 @@ class Chunk:
 
 
 def _clean_text(raw: str) -> str:
-    text = raw.replace(".-", "-")
-    text = text.replace("\r", " ").replace("\n", " ")
-    text = re.sub(r"\s+", " ", text)
-    return text.strip()
+    # ``\s`` already covers CR/LF, so one compiled substitution replaces the separate passes.
+    return _WHITESPACE.sub(" ", raw.replace(".-", "-")).strip()
+
 
+@lru_cache(maxsize=1)
+def _encoding() -> tiktoken.Encoding:
+    # Tokenizer of the text-embedding-3 models, so chunk sizes are measured in billed tokens.
+    # The first load may download the BPE ranks; ingest loads it up front so forked extraction
+    # workers inherit it.
+    return tiktoken.get_encoding(_TOKENIZER)
 
-def _chunk_words(text: str, max_words: int, overlap: int) -> Iterator[str]:
-    words = text.split()
-    if not words:
+
+def _chunk_tokens(text: str, max_tokens: int, overlap: int) -> Iterator[str]:
+    encoding = _encoding()
+    tokens = encoding.encode(text)
+    if not tokens:
         return
 
-    step = max(max_words - overlap, 1)
-    total = len(words)
+    step = max(max_tokens - overlap, 1)
+    total = len(tokens)
     start = 0
     while start < total:
-        end = min(total, start + max_words)
-        chunk_words = words[start:end]
-        chunk_text = " ".join(chunk_words).strip()
+        end = min(total, start + max_tokens)
+        # A window edge can split a multi-byte character across tokens; drop the partial bytes
+        # rather than decoding them to U+FFFD.
+        chunk_text = encoding.decode_bytes(tokens[start:end]).decode("utf-8", errors="ignore").strip()
         if chunk_text:
             yield chunk_text
         if end == total:
@@ -62,105 +90,390 @@ def _chunk_words(text: str, max_words: int, overlap: int) -> Iterator[str]:
         start += step
 
 
-def _iter_pdf_chunks(cfg: Settings) -> Iterator[Chunk]:
-    if not PDF_DIR.exists():
-        raise FileNotFoundError(f"PDF directory not found: {PDF_DIR}")
+def _extract_pdf(pdf_path: Path, chunk_size: int, overlap: int) -> tuple[List[Chunk], List[str]]:
+    """Extract and chunk one PDF, returning the chunks plus any per-page warnings.
 
-    pdf_paths: List[Path] = sorted(PDF_DIR.glob("*.pdf"))
-    if not pdf_paths:
-        raise FileNotFoundError("No PDF files found in the Ambedkar_Writings directory.")
+    Runs inside a worker process, so it reports problems through its return value rather
+    than the console.
+    """
+
+    from pypdf import PdfReader
 
-    for pdf_path in pdf_paths:
+    reader = PdfReader(str(pdf_path))
+    chunks: List[Chunk] = []
+    warnings: List[str] = []
+    for page_number, page in enumerate(reader.pages, start=1):
         try:
-            from pypdf import PdfReader
+            raw_text = page.extract_text() or ""
+        except Exception as exc:  # pragma: no cover
+            warnings.append(f"Skipping page {page_number} of {pdf_path.name}: {exc}")
+            continue
 
-            reader = PdfReader(str(pdf_path))
-        except Exception as exc:  # pragma: no cover - defensive logging only
-            console.print(f"[red]Failed to read {pdf_path.name}: {exc}")
+        cleaned = _clean_text(raw_text)
+        if not cleaned:
             continue
 
-        for page_number, page in enumerate(reader.pages, start=1):
-            try:
-                raw_text = page.extract_text() or ""
-            except Exception as exc:  # pragma: no cover
-                console.print(f"[yellow]Skipping page {page_number} of {pdf_path.name}: {exc}")
-                continue
-
-            cleaned = _clean_text(raw_text)
-            if not cleaned:
-                continue
-
-            for chunk_idx, chunk_text in enumerate(
-                _chunk_words(cleaned, cfg.chunk_size, cfg.chunk_overlap), start=1
-            ):
-                chunk_id = f"{pdf_path.stem}_p{page_number}_c{chunk_idx}"
-                yield Chunk(
-                    chunk_id=chunk_id,
+        for chunk_idx, chunk_text in enumerate(_chunk_tokens(cleaned, chunk_size, overlap), start=1):
+            chunks.append(
+                Chunk(
+                    chunk_id=f"{pdf_path.stem}_p{page_number}_c{chunk_idx}",
                     content=chunk_text,
                     source=pdf_path.name,
                     page=page_number,
                 )
+            )
+    return chunks, warnings
 
 
-def ingest_corpus(rebuild: bool = True) -> None:
-    """Create or refresh the Annoy index from the Ambedkar writings."""
+def _staged(path: Path) -> Path:
+    # Ingest writes every artefact beside its final name and swaps them in only once the whole
+    # store is complete, so an interrupted run never leaves a half-written store behind.
+    return path.with_name(path.name + ".tmp")
 
-    cfg = settings()
-    cfg.ensure_api_key()
 
-    if rebuild:
-        for artefact in (INDEX_FILE, METADATA_FILE, INDEX_INFO_FILE):
-            if artefact.exists():
-                artefact.unlink()
+def _chunk_cache_file(pdf_path: Path, cfg: Settings) -> Path:
+    # Any change to the file or to the chunking parameters produces a new cache key.
+    stat = pdf_path.stat()
+    key = f"{stat.st_mtime_ns}:{stat.st_size}:{cfg.chunk_size}:{cfg.chunk_overlap}:{_TOKENIZER}"
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:_CACHE_DIGEST_LENGTH]
+    return CHUNK_CACHE_DIR / f"{pdf_path.stem}.{digest}.chunks"
 
-    chunks = list(_iter_pdf_chunks(cfg))
-    if not chunks:
-        console.print("[yellow]No textual content extracted from PDFs.")
-        return
 
-    embedder = EmbeddingClient(cfg)
-    console.print(f"[green]Embedding {len(chunks)} chunks using {cfg.embedding_model}...")
+def _read_chunk_cache(cache_file: Path) -> Optional[List[Chunk]]:
+    try:
+        return [Chunk(**record) for record in orjson.loads(cache_file.read_bytes())]
+    except (OSError, orjson.JSONDecodeError, TypeError):
+        return None
 
-    vectors = embedder.embed_texts([chunk.content for chunk in chunks])
 
-    if not vectors:
-        raise RuntimeError("Embedding generation returned no vectors.")
+def _write_chunk_cache(pdf_path: Path, cache_file: Path, chunks: List[Chunk]) -> None:
+    CHUNK_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    # Match the digest length exactly so "vol.1.pdf" never sweeps up the entries of "vol.pdf".
+    pattern = f"{glob.escape(pdf_path.stem)}.{'?' * _CACHE_DIGEST_LENGTH}.chunks"
+    for stale in CHUNK_CACHE_DIR.glob(pattern):
+        stale.unlink(missing_ok=True)
+    cache_file.write_bytes(orjson.dumps([asdict(chunk) for chunk in chunks]))
 
-    dimension = len(vectors[0])
-    index = AnnoyIndex(dimension, "angular")
-    for idx, vector in enumerate(vectors):
-        index.add_item(idx, vector)
-    index.build(50)
+
+def _iter_pdf_chunks(cfg: Settings) -> Iterator[Chunk]:
+    if not PDF_DIR.exists():
+        raise FileNotFoundError(f"PDF directory not found: {PDF_DIR}")
+
+    pdf_paths: List[Path] = sorted(PDF_DIR.glob("*.pdf"))
+    if not pdf_paths:
+        raise FileNotFoundError("No PDF files found in the Ambedkar_Writings directory.")
+
+    workers = min(cfg.extract_workers or os.cpu_count() or 1, len(pdf_paths))
+    pending_paths = iter(pdf_paths)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Keep a bounded window of PDFs in flight so extracted chunks cannot pile up while the
+        # embedding stage catches up, and yield them in file order so ingests stay reproducible.
+        # Entries without a future are PDFs whose chunks are already cached on disk.
+        in_flight: Deque[tuple[Path, Path, Optional[Future]]] = deque()
+
+        def submit_next() -> None:
+            pdf_path = next(pending_paths, None)
+            if pdf_path is None:
+                return
+            cache_file = _chunk_cache_file(pdf_path, cfg)
+            future = None
+            if not cache_file.exists():
+                future = pool.submit(_extract_pdf, pdf_path, cfg.chunk_size, cfg.chunk_overlap)
+            in_flight.append((pdf_path, cache_file, future))
+
+        for _ in range(workers * 2):
+            submit_next()
+
+        while in_flight:
+            pdf_path, cache_file, future = in_flight.popleft()
+            submit_next()
+            chunks = _read_chunk_cache(cache_file) if future is None else None
+            warnings: List[str] = []
+            if chunks is None:
+                try:
+                    if future is not None:
+                        chunks, warnings = future.result()
+                    else:  # unreadable cache entry; extract in-process instead
+                        chunks, warnings = _extract_pdf(pdf_path, cfg.chunk_size, cfg.chunk_overlap)
+                except Exception as exc:  # pragma: no cover - defensive logging only
+                    console.print(f"[red]Failed to read {pdf_path.name}: {exc}")
+                    continue
+                _write_chunk_cache(pdf_path, cache_file, chunks)
+            for warning in warnings:
+                console.print(f"[yellow]{warning}")
+            yield from chunks
+
+
+class _IndexWriter:
+    """Grows the ANN index batch by batch as embeddings stream in."""
+
+    def __init__(self, backend: str, dimension: int) -> None:
+        self.backend = backend
+        self.dimension = dimension
+        if backend == "hnsw":
+            # Embeddings arrive L2-normalised, so inner product equals cosine similarity
+            # without the index renormalising every vector.
+            self.metric = "ip"
+            self._capacity = 1024
+            self._index = hnswlib.Index(space=self.metric, dim=dimension)
+            self._index.init_index(max_elements=self._capacity, ef_construction=200, M=32)
+            self._index.set_num_threads(os.cpu_count() or 1)
+        else:
+            self.metric = "angular"
+            self._index = AnnoyIndex(dimension, self.metric)
+
+    def add(self, start: int, vectors: np.ndarray) -> None:
+        if self.backend == "hnsw":
+            end = start + len(vectors)
+            if end > self._capacity:
+                self._capacity = max(self._capacity * 2, end)
+                self._index.resize_index(self._capacity)
+            # One bulk call over the contiguous float32 block instead of a call per vector.
+            self._index.add_items(vectors, np.arange(start, end))
+        else:
+            for offset in range(len(vectors)):
+                self._index.add_item(start + offset, vectors[offset])
+
+    def save(self, path: Path, count: int) -> None:
+        if self.backend == "hnsw":
+            self._index.resize_index(count)
+            self._index.save_index(str(path))
+        else:
+            self._index.build(50)
+            self._index.save(str(path))
+
+
+class _MetadataWriter:
+    """Packs chunk records into a contiguous blob plus an ``int64`` (start, end) offset table.
+
+    The legacy JSONL file is written alongside when requested.
+    """
+
+    def __init__(self, write_jsonl: bool) -> None:
+        self._blob = _staged(METADATA_BLOB_FILE).open("wb")
+        self._offsets = _staged(METADATA_OFFSETS_FILE).open("wb")
+        self._jsonl = _staged(METADATA_FILE).open("wb") if write_jsonl else None
+        self._position = 0
+
+    def __enter__(self) -> "_MetadataWriter":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        for fh in (self._blob, self._offsets, self._jsonl):
+            if fh is not None:
+                fh.close()
+
+    def write(self, records: List[dict]) -> None:
+        spans = np.empty((len(records), 2), dtype=np.int64)
+        for row, record in enumerate(records):
+            data = orjson.dumps(record)
+            self._blob.write(data)
+            spans[row] = (self._position, self._position + len(data))
+            self._position += len(data)
+            if self._jsonl is not None:
+                self._jsonl.write(data)
+                self._jsonl.write(b"\n")
+        self._offsets.write(spans.tobytes())
+
+
+class _VectorWriter:
+    """Spools normalised float32 rows to disk, then packs them into the ``.npy`` vector file.
+
+    The row count is unknown while streaming, so rows go to a raw spool first and are copied
+    into a properly headed array once ingest finishes.
+    """
+
+    _COPY_ROWS = 65536
+
+    def __init__(self) -> None:
+        self._spool_path = VECTORS_FILE.with_suffix(".spool")
+        self._spool = self._spool_path.open("wb")
+        self.count = 0
+        self.dimension = 0
+
+    def __enter__(self) -> "_VectorWriter":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self._spool.close()
+        self._spool_path.unlink(missing_ok=True)
+
+    def write(self, vectors: np.ndarray) -> None:
+        self._spool.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        self.count += len(vectors)
+        self.dimension = vectors.shape[1]
+
+    def finish(self, quantization: str) -> dict:
+        """Pack the spooled rows into the staged vector file and return its info-file fields.
+
+        With ``int8`` quantization rows are stored as ``round(v * 127 / scale)`` using one global
+        ``scale`` (the largest absolute component), a quarter of the float32 footprint.
+        """
+
+        self._spool.close()
+        rows = np.memmap(self._spool_path, dtype=np.float32, mode="r", shape=(self.count, self.dimension))
+        blocks = range(0, self.count, self._COPY_ROWS)
+        fields: dict = {"quant": quantization}
+        if quantization == "int8":
+            scale = max(float(np.abs(rows[start : start + self._COPY_ROWS]).max()) for start in blocks)
+            scale = scale or 1.0
+            fields["scale"] = scale
+            dtype = np.int8
+        else:
+            dtype = np.float32
+        packed = np.lib.format.open_memmap(
+            _staged(VECTORS_FILE), mode="w+", dtype=dtype, shape=(self.count, self.dimension)
+        )
+        for start in blocks:
+            block = rows[start : start + self._COPY_ROWS]
+            if quantization == "int8":
+                block = np.clip(np.rint(block * (127.0 / scale)), -127, 127).astype(np.int8)
+            packed[start : start + self._COPY_ROWS] = block
+        packed.flush()
+        del packed, rows
+        return fields
+
+
+def ingest_corpus(rebuild: bool = True, use_batch_api: bool = False) -> None:
+    """Create or refresh the vector index from the Ambedkar writings.
+
+    With ``use_batch_api`` the embeddings are requested through the OpenAI Batch API, one job
+    per ``cfg.batch_api_max_chunks`` chunks, each awaited before the next is submitted.
+
+    Whether or not ``rebuild`` is set, the previous store stays in place until the new one is
+    complete and swapped in.
+    """
+
+    cfg = settings()
+    cfg.ensure_api_key()
+    if cfg.index_backend not in _INDEX_BACKENDS:
+        raise ValueError(
+            f"Unsupported INDEX_BACKEND {cfg.index_backend!r}; expected one of {', '.join(_INDEX_BACKENDS)}."
+        )
+    if cfg.vector_quantization not in _VECTOR_QUANTIZATIONS:
+        raise ValueError(
+            f"Unsupported VECTOR_QUANT {cfg.vector_quantization!r}; "
+            f"expected one of {', '.join(_VECTOR_QUANTIZATIONS)}."
+        )
+
+    try:
+        _encoding()
+    except Exception as exc:
+        raise RuntimeError(f"Could not load the {_TOKENIZER} tokenizer: {exc}") from exc
 
     DATA_DIR.mkdir(parents=True, exist_ok=True)
-    index.save(str(INDEX_FILE))
-
-    with METADATA_FILE.open("wb") as fh:
-        for idx, chunk in enumerate(chunks):
-            record = {
-                "int_id": idx,
-                "chunk_id": chunk.chunk_id,
-                "source": chunk.source,
-                "page": chunk.page,
-                "content": chunk.content,
-            }
-            fh.write(orjson.dumps(record))
-            fh.write(b"\n")
+    embedder = EmbeddingClient(cfg, checkpoint=EMBED_CHECKPOINT_FILE)
+    console.print(f"[green]Embedding chunks using {cfg.embedding_model}...")
+
+    if use_batch_api:
+
+        def submit(texts: List[str]) -> Future:
+            # Batch jobs run one after another, so the result is ready once the call returns.
+            future: Future = Future()
+            future.set_result(embedder.embed_texts_batch(texts))
+            return future
+
+        flush_size = max(cfg.batch_api_max_chunks, 1)
+    else:
+        submit = embedder.submit_texts
+        # Flush enough chunks per call to keep every concurrent embedding request busy.
+        flush_size = cfg.batch_size * max(cfg.max_concurrency, 1)
+    index: _IndexWriter | None = None
+    vector_fields: dict = {}
+    count = 0
+    sources: Set[str] = set()
+    buffer: List[Chunk] = []
+    # The flush whose embeddings are still in flight; it is collected once the next one has been
+    # submitted, so requests keep running across flush boundaries.
+    in_flight: Optional[tuple[Future, List[Chunk]]] = None
+
+    def collect(metadata: _MetadataWriter, vector_file: _VectorWriter) -> None:
+        nonlocal index, count, in_flight
+        if in_flight is None:
+            return
+        future, chunks = in_flight
+        in_flight = None
+        vectors = future.result()
+        if len(vectors) != len(chunks):
+            raise RuntimeError("Embedding generation returned an unexpected number of vectors.")
+        if index is None:
+            index = _IndexWriter(cfg.index_backend, vectors.shape[1])
+        index.add(count, vectors)
+        vector_file.write(vectors)
+        records: List[dict] = []
+        for chunk in chunks:
+            records.append(
+                {
+                    "int_id": count,
+                    "chunk_id": chunk.chunk_id,
+                    "source": chunk.source,
+                    "page": chunk.page,
+                    "content": chunk.content,
+                }
+            )
+            sources.add(chunk.source)
+            count += 1
+        metadata.write(records)
+
+    def flush(metadata: _MetadataWriter, vector_file: _VectorWriter) -> None:
+        nonlocal buffer, in_flight
+        if use_batch_api:
+            console.print(f"[green]Submitting {len(buffer)} chunks to the OpenAI Batch API...")
+        future = submit([chunk.content for chunk in buffer])
+        collect(metadata, vector_file)
+        in_flight = (future, buffer)
+        buffer = []
+
+    try:
+        with _MetadataWriter(cfg.write_jsonl_metadata) as metadata, _VectorWriter() as vector_file:
+            for chunk in _iter_pdf_chunks(cfg):
+                buffer.append(chunk)
+                if len(buffer) >= flush_size:
+                    flush(metadata, vector_file)
+            if buffer:
+                flush(metadata, vector_file)
+            collect(metadata, vector_file)
+            if index is not None:
+                vector_fields = vector_file.finish(cfg.vector_quantization)
+    finally:
+        embedder.close()
+
+    if index is None:
+        for artefact in (METADATA_FILE, METADATA_OFFSETS_FILE, METADATA_BLOB_FILE):
+            _staged(artefact).unlink(missing_ok=True)
+        console.print("[yellow]No textual content extracted from PDFs.")
+        return
+
+    index.save(_staged(INDEX_FILE), count)
 
     info = {
         "built_at": datetime.utcnow().isoformat() + "Z",
         "embedding_model": cfg.embedding_model,
+        "embedding_dimensions": cfg.requested_dimensions,
         "chunk_size": cfg.chunk_size,
         "chunk_overlap": cfg.chunk_overlap,
-        "vector_count": len(chunks),
-        "dimension": dimension,
-        "index_metric": "angular",
+        "vector_count": count,
+        "dimension": index.dimension,
+        "index_backend": index.backend,
+        "index_metric": index.metric,
+        **vector_fields,
     }
-    INDEX_INFO_FILE.write_bytes(orjson.dumps(info))
-
-    console.print(
-        f"[green]Vector store ready with {len(chunks)} chunks across {len(set(c.source for c in chunks))} PDFs."
-    )
+    _staged(INDEX_INFO_FILE).write_bytes(orjson.dumps(info))
+
+    # The store refuses to load without its info file, so drop it while the data files are
+    # swapped and move the new one in last.
+    INDEX_INFO_FILE.unlink(missing_ok=True)
+    artefacts = [INDEX_FILE, METADATA_BLOB_FILE, METADATA_OFFSETS_FILE, VECTORS_FILE]
+    if cfg.write_jsonl_metadata:
+        artefacts.append(METADATA_FILE)
+    else:
+        METADATA_FILE.unlink(missing_ok=True)
+    for artefact in artefacts:
+        os.replace(_staged(artefact), artefact)
+    os.replace(_staged(INDEX_INFO_FILE), INDEX_INFO_FILE)
+    EMBED_CHECKPOINT_FILE.unlink(missing_ok=True)
+
+    console.print(f"[green]Vector store ready with {count} chunks across {len(sources)} PDFs.")
 
 
 __all__ = ["ingest_corpus"]
@@ -1,14 +1,31 @@
-"""Annoy-based vector store loader and search utilities."""
+"""HNSW/Annoy vector store loader and search utilities."""
 
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import List
+import atexit
+import mmap
+import os
+import zipfile
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import List, Optional
 
+import hnswlib
+import numpy as np
 import orjson
 from annoy import AnnoyIndex
 
-from .config import INDEX_FILE, INDEX_INFO_FILE, METADATA_FILE, Settings, settings
+from .config import (
+    INDEX_FILE,
+    INDEX_INFO_FILE,
+    METADATA_BLOB_FILE,
+    METADATA_FILE,
+    METADATA_OFFSETS_FILE,
+    QUERY_CACHE_FILE,
+    VECTORS_FILE,
+    Settings,
+    settings,
+)
 from .embedding import EmbeddingClient
 
 
@@ -22,21 +39,61 @@ class RetrievedChunk:
 
 
 class VectorStore:
-    """Simple wrapper over an Annoy index and its metadata."""
+    """Simple wrapper over an HNSW (or legacy Annoy) index and its metadata."""
 
     def __init__(self, cfg: Settings | None = None) -> None:
         self.cfg = cfg or settings()
-        if not INDEX_FILE.exists() or not METADATA_FILE.exists() or not INDEX_INFO_FILE.exists():
+        packed_metadata = METADATA_OFFSETS_FILE.exists() and METADATA_BLOB_FILE.exists()
+        if (
+            not INDEX_FILE.exists()
+            or not INDEX_INFO_FILE.exists()
+            or not (packed_metadata or METADATA_FILE.exists())
+        ):
             raise FileNotFoundError(
                 "Vector store files not found. Run `poetry run ambedkar-chatbot ingest` first."
             )
         info = orjson.loads(INDEX_INFO_FILE.read_bytes())
         self.dimension = info["dimension"]
         self.embedding_model = info["embedding_model"]
-        self._index = AnnoyIndex(self.dimension, info.get("index_metric", "angular"))
-        self._index.load(str(INDEX_FILE))
-        self._metadata = self._load_metadata()
-        self._embedder = EmbeddingClient(self.cfg)
+        self.vector_count = info["vector_count"]
+        # Stores built before the HNSW switch carry no backend flag and are Annoy indexes.
+        self.backend = info.get("index_backend", "annoy")
+        self.metric = info.get("index_metric", "angular")
+        if self.backend == "hnsw":
+            self._index = hnswlib.Index(space=self.metric, dim=self.dimension)
+            self._index.load_index(str(INDEX_FILE), max_elements=self.vector_count)
+            self._ef = 0
+        else:
+            self._index = AnnoyIndex(self.dimension, self.metric)
+            self._index.load(str(INDEX_FILE))
+        self._metadata: Optional[List[dict]] = None
+        if packed_metadata:
+            # Records are decoded lazily from the memory-mapped blob, top_k at a time.
+            self._offsets = np.memmap(METADATA_OFFSETS_FILE, dtype=np.int64, mode="r").reshape(-1, 2)
+            with METADATA_BLOB_FILE.open("rb") as fh:
+                self._blob = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._metadata = self._load_metadata()
+        # Exact (float32) or int8-quantized vectors for re-ranking ANN candidates; memory-mapped
+        # so only the candidate rows are read.
+        self._vectors: Optional[np.ndarray] = None
+        if VECTORS_FILE.exists():
+            vectors = np.load(VECTORS_FILE, mmap_mode="r")
+            if vectors.shape == (self.vector_count, self.dimension):
+                self._vectors = vectors
+        # Queries must be embedded exactly like the corpus, whatever the current environment says.
+        self._embedder = EmbeddingClient(
+            replace(
+                self.cfg,
+                embedding_model=self.embedding_model,
+                embedding_dimensions=info.get("embedding_dimensions", 0),
+            )
+        )
+        # LRU of query embeddings so repeated questions skip the API round-trip; persisted
+        # across CLI sessions.
+        self._query_cache: OrderedDict[str, np.ndarray] = self._load_query_cache()
+        self._query_cache_dirty = False
+        atexit.register(self.save_query_cache)
 
     def _load_metadata(self) -> List[dict]:
         metadata: List[dict] = []
@@ -45,26 +102,107 @@ class VectorStore:
                 metadata.append(orjson.loads(line))
         return metadata
 
+    def _lookup(self, idx: int) -> dict:
+        if self._metadata is not None:
+            return self._metadata[idx]
+        start, end = self._offsets[idx]
+        return orjson.loads(self._blob[start:end])
+
+    def _load_query_cache(self) -> OrderedDict[str, np.ndarray]:
+        cache: OrderedDict[str, np.ndarray] = OrderedDict()
+        if self.cfg.query_cache_size <= 0 or not QUERY_CACHE_FILE.exists():
+            return cache
+        try:
+            with np.load(QUERY_CACHE_FILE) as data:
+                keys, vectors = data["keys"], data["vectors"]
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+            return cache  # unreadable cache; it is rebuilt as queries come in
+        if vectors.ndim != 2 or vectors.shape[1] != self.dimension:
+            return cache  # the store was rebuilt with different embeddings
+        for key, vector in zip(keys.tolist(), vectors):
+            cache[key] = vector
+        while len(cache) > self.cfg.query_cache_size:
+            cache.popitem(last=False)
+        return cache
+
+    def save_query_cache(self) -> None:
+        """Persist the query embedding cache if it changed since it was loaded."""
+
+        if not self._query_cache_dirty or not self._query_cache:
+            return
+        # Written from an atexit hook, so swap a complete file in rather than writing in place.
+        staged = QUERY_CACHE_FILE.with_name(QUERY_CACHE_FILE.name + ".tmp")
+        with staged.open("wb") as fh:
+            np.savez(
+                fh,
+                keys=np.array(list(self._query_cache.keys())),
+                vectors=np.stack(list(self._query_cache.values())),
+            )
+        os.replace(staged, QUERY_CACHE_FILE)
+        self._query_cache_dirty = False
+
+    def _embed_query(self, query: str) -> np.ndarray:
+        key = f"{self.embedding_model}\0{' '.join(query.lower().split())}"
+        vector = self._query_cache.get(key)
+        if vector is not None:
+            self._query_cache.move_to_end(key)
+            return vector
+        vector = self._embedder.embed_query(query)
+        if self.cfg.query_cache_size > 0:
+            self._query_cache[key] = vector
+            self._query_cache_dirty = True
+            while len(self._query_cache) > self.cfg.query_cache_size:
+                self._query_cache.popitem(last=False)
+        return vector
+
     def _score_from_distance(self, distance: float) -> float:
-        # Annoy angular distance (0..2). Convert to an affinity score for presentation.
-        return max(min(1 - distance / 2, 1.0), 0.0)
+        if self.metric == "angular":
+            # Annoy angular distance (0..2). Convert to an affinity score for presentation.
+            return max(min(1 - distance / 2, 1.0), 0.0)
+        # hnswlib "ip" (and legacy "cosine") distance is 1 - inner product of unit vectors.
+        return max(min(1 - distance, 1.0), 0.0)
+
+    def _nearest(self, query_vector: np.ndarray, top_k: int) -> tuple[List[int], List[float]]:
+        if self.backend == "annoy":
+            return self._index.get_nns_by_vector(query_vector, n=top_k, include_distances=True)
+        top_k = min(top_k, self.vector_count)
+        ef = max(top_k * 4, 50)
+        if ef != self._ef:
+            self._index.set_ef(ef)
+            self._ef = ef
+        labels, distances = self._index.knn_query(query_vector, k=top_k)
+        return labels[0].tolist(), distances[0].tolist()
+
+    def _rerank(self, query_vector: np.ndarray, top_k: int) -> tuple[List[int], List[float]]:
+        # Over-fetch from the ANN index, then order candidates by exact cosine similarity.
+        candidates, _ = self._nearest(query_vector, top_k * max(self.cfg.rerank_factor, 1))
+        if not candidates:
+            return [], []
+        rows = self._vectors[candidates].astype(np.float32)
+        # Dividing by the row norm undoes any int8 quantization scale (and its rounding drift).
+        similarities = (rows @ query_vector) / np.linalg.norm(rows, axis=1).clip(min=1e-12)
+        order = np.argsort(-similarities)[:top_k]
+        return [candidates[i] for i in order], [float(similarities[i]) for i in order]
 
     def similarity_search(self, query: str, top_k: int | None = None) -> List[RetrievedChunk]:
         top_k = top_k or self.cfg.top_k
-        query_vector = self._embedder.embed_query(query)
-        indices, distances = self._index.get_nns_by_vector(
-            query_vector, n=top_k, include_distances=True
-        )
+        query_vector = self._embed_query(query)
+        if self._vectors is not None:
+            indices, similarities = self._rerank(query_vector, top_k)
+            scores = [max(min(similarity, 1.0), 0.0) for similarity in similarities]
+        else:
+            indices, distances = self._nearest(query_vector, top_k)
+            scores = [self._score_from_distance(distance) for distance in distances]
         results: List[RetrievedChunk] = []
-        for idx, distance in zip(indices, distances):
-            meta = self._metadata[idx]
+        for idx, score in zip(indices, scores):
+            meta = self._lookup(idx)
             results.append(
                 RetrievedChunk(
                     chunk_id=meta["chunk_id"],
                     content=meta["content"],
                     source=meta["source"],
                     page=meta["page"],
-                    score=self._score_from_distance(distance),
+                    score=score,
                 )
             )
         return results
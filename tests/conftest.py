@@ -0,0 +1,159 @@
+"""Shared fixtures: an in-memory stand-in for the OpenAI API and a throwaway data directory."""
+
+from __future__ import annotations
+
+import random
+import zlib
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, Iterator, List
+
+import numpy as np
+import orjson
+import pytest
+
+from ambedkar_chatbot import config, embedding, ingest, vector_store
+from ambedkar_chatbot.config import Settings
+
+DIMENSION = 8
+
+
+def fake_embedding(text: str) -> List[float]:
+    """Deterministic, unnormalised vector for ``text``."""
+
+    rng = np.random.default_rng(zlib.crc32(text.encode("utf-8")))
+    return rng.normal(size=DIMENSION).astype(np.float32).tolist()
+
+
+def _embedding_response(texts: List[str]) -> SimpleNamespace:
+    return SimpleNamespace(
+        data=[SimpleNamespace(index=idx, embedding=fake_embedding(text)) for idx, text in enumerate(texts)]
+    )
+
+
+class _Embeddings:
+    def create(self, model: str, input: List[str], **options: object) -> SimpleNamespace:
+        return _embedding_response(list(input))
+
+
+class _Files:
+    def __init__(self, client: "FakeOpenAI") -> None:
+        self._client = client
+
+    def create(self, file, purpose: str) -> SimpleNamespace:
+        file_id = f"file-{len(self._client.uploads)}"
+        self._client.uploads[file_id] = [orjson.loads(line) for line in file.read().splitlines()]
+        return SimpleNamespace(id=file_id)
+
+    def content(self, file_id: str) -> SimpleNamespace:
+        # Batch output arrives in arbitrary order, and so do the rows inside each response.
+        shuffle = random.Random(0).shuffle
+        lines = []
+        for request in self._client.uploads[file_id]:
+            data = [
+                {"index": idx, "embedding": fake_embedding(text)}
+                for idx, text in enumerate(request["body"]["input"])
+            ]
+            shuffle(data)
+            response = {"status_code": 200, "body": {"data": data}}
+            lines.append(orjson.dumps({"custom_id": request["custom_id"], "response": response}))
+        shuffle(lines)
+        return SimpleNamespace(content=b"\n".join(lines))
+
+
+class _Batches:
+    def __init__(self, client: "FakeOpenAI") -> None:
+        self._client = client
+        self.created = 0
+
+    def create(self, input_file_id: str, endpoint: str, completion_window: str) -> SimpleNamespace:
+        self.created += 1
+        batch_id = f"batch-{self.created}"
+        self._client.jobs[batch_id] = input_file_id
+        return SimpleNamespace(id=batch_id, status="validating", output_file_id=None)
+
+    def retrieve(self, batch_id: str) -> SimpleNamespace:
+        return SimpleNamespace(id=batch_id, status="completed", output_file_id=self._client.jobs[batch_id])
+
+
+class FakeOpenAI:
+    """Stands in for ``openai.OpenAI``: deterministic embeddings plus an in-memory Batch API."""
+
+    def __init__(self, **kwargs: object) -> None:
+        self.uploads: Dict[str, List[dict]] = {}
+        self.jobs: Dict[str, str] = {}
+        self.embeddings = _Embeddings()
+        self.files = _Files(self)
+        self.batches = _Batches(self)
+
+
+class FakeAsyncOpenAI:
+    """Stands in for ``openai.AsyncOpenAI`` on the concurrent embedding path."""
+
+    def __init__(self, **kwargs: object) -> None:
+        self.embeddings = self
+
+    async def close(self) -> None:
+        return None
+
+    async def create(self, model: str, input: List[str], **options: object) -> SimpleNamespace:
+        return _embedding_response(list(input))
+
+
+@pytest.fixture
+def cfg() -> Settings:
+    return Settings(
+        openai_api_key="test-key",
+        embedding_dimensions=0,
+        batch_size=4,
+        max_requests_per_minute=10_000,
+        max_tokens_per_minute=10_000_000,
+        query_cache_size=0,
+    )
+
+
+@pytest.fixture(autouse=True)
+def fake_openai(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(embedding, "OpenAI", FakeOpenAI)
+    monkeypatch.setattr(embedding, "AsyncOpenAI", FakeAsyncOpenAI)
+    monkeypatch.setattr(embedding, "_BATCH_POLL_SECONDS", 0)
+
+
+@pytest.fixture
+def data_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Point every data-file constant imported by ``ingest`` and ``vector_store`` at ``tmp_path``."""
+
+    for name in config.__all__:
+        value = getattr(config, name)
+        if not isinstance(value, Path) or not str(value).startswith(str(config.DATA_DIR)):
+            continue
+        redirected = tmp_path / value.relative_to(config.DATA_DIR)
+        for module in (ingest, vector_store):
+            if hasattr(module, name):
+                monkeypatch.setattr(module, name, redirected)
+    # A store's exit hook would otherwise save its query cache after the paths are restored.
+    monkeypatch.setattr(vector_store.atexit, "register", lambda func: func)
+    return tmp_path
+
+
+def make_chunks(count: int) -> List[ingest.Chunk]:
+    return [
+        ingest.Chunk(chunk_id=f"vol1_p{idx}_c1", content=f"passage {idx} — ज्ञान", source="vol1.pdf", page=idx)
+        for idx in range(count)
+    ]
+
+
+@pytest.fixture
+def build_store(cfg: Settings, data_dir: Path, monkeypatch: pytest.MonkeyPatch):
+    """Run ``ingest_corpus`` over synthetic chunks, skipping PDF extraction and the tokenizer."""
+
+    def build(chunks: List[ingest.Chunk], settings: Settings = cfg, rebuild: bool = True) -> None:
+        def iter_chunks(_: Settings) -> Iterator[ingest.Chunk]:
+            yield from chunks
+
+        monkeypatch.setattr(ingest, "settings", lambda: settings)
+        monkeypatch.setattr(ingest, "_encoding", lambda: None)
+        monkeypatch.setattr(ingest, "_iter_pdf_chunks", iter_chunks)
+        ingest.ingest_corpus(rebuild=rebuild)
+
+    return build
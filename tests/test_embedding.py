@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+from dataclasses import replace
+
+import numpy as np
+import pytest
+
+from ambedkar_chatbot import embedding
+from ambedkar_chatbot.embedding import EmbeddingClient
+
+from .conftest import FakeAsyncOpenAI, fake_embedding
+
+
+def _expected(texts) -> np.ndarray:
+    vectors = np.asarray([fake_embedding(text) for text in texts], dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_embed_texts_batch_restores_input_order(cfg):
+    texts = [f"chunk {idx}" for idx in range(23)]  # several requests, the last one partial
+
+    vectors = EmbeddingClient(cfg).embed_texts_batch(texts)
+
+    assert vectors.dtype == np.float32
+    np.testing.assert_allclose(vectors, _expected(texts), rtol=1e-6)
+
+
+def test_embed_texts_batch_resumes_submitted_job(cfg, tmp_path):
+    texts = [f"chunk {idx}" for idx in range(9)]
+    checkpoint = tmp_path / "checkpoint.jsonl"
+
+    first = EmbeddingClient(cfg, checkpoint=checkpoint)
+    first.embed_texts_batch(texts)
+    rerun = EmbeddingClient(cfg, checkpoint=checkpoint)
+    rerun.client = first.client
+    vectors = rerun.embed_texts_batch(texts)
+
+    assert first.client.batches.created == 1
+    np.testing.assert_allclose(vectors, _expected(texts), rtol=1e-6)
+
+
+def test_embed_texts_matches_batch_api(cfg):
+    texts = [f"chunk {idx}" for idx in range(11)]
+    client = EmbeddingClient(cfg)
+
+    np.testing.assert_allclose(client.embed_texts(texts), client.embed_texts_batch(texts), rtol=1e-6)
+
+
+def test_embed_texts_resumes_from_checkpoint(cfg, tmp_path, monkeypatch):
+    texts = [f"chunk {idx}" for idx in range(10)]
+    checkpoint = tmp_path / "checkpoint.jsonl"
+    EmbeddingClient(cfg, checkpoint=checkpoint).embed_texts(texts[:6])
+    with checkpoint.open("ab") as fh:
+        fh.write(b'{"key":"torn')  # a write cut short by a crash
+
+    requested = []
+
+    class RecordingAsyncOpenAI(FakeAsyncOpenAI):
+        async def create(self, model, input, **options):
+            requested.append(list(input))
+            return await super().create(model, input, **options)
+
+    monkeypatch.setattr(embedding, "AsyncOpenAI", RecordingAsyncOpenAI)
+    client = EmbeddingClient(cfg, checkpoint=checkpoint)
+    vectors = client.embed_texts(texts)
+
+    # Batches of four: the first one was checkpointed; the rest differ from the first run's.
+    assert requested == [texts[4:8], texts[8:]]
+    assert all(isinstance(offset, int) for offset in client._resume.values())
+    np.testing.assert_allclose(vectors, _expected(texts), rtol=1e-6)
+
+
+def test_embed_texts_reuses_one_async_client(cfg, monkeypatch):
+    created = []
+
+    class CountingAsyncOpenAI(FakeAsyncOpenAI):
+        def __init__(self, **kwargs):
+            super().__init__(**kwargs)
+            created.append(self)
+
+    monkeypatch.setattr(embedding, "AsyncOpenAI", CountingAsyncOpenAI)
+    client = EmbeddingClient(cfg)
+    texts = [f"chunk {idx}" for idx in range(30)]
+    # Submitting the next call before collecting the previous one, as ingest does.
+    futures = [client.submit_texts(texts[start : start + 10]) for start in range(0, 30, 10)]
+    vectors = np.concatenate([future.result() for future in futures])
+    client.close()
+
+    assert len(created) == 1
+    assert client._loop is None
+    np.testing.assert_allclose(vectors, _expected(texts), rtol=1e-6)
+
+
+@pytest.mark.parametrize(
+    ("model", "expected"),
+    [("text-embedding-3-small", {"dimensions": 256}), ("text-embedding-ada-002", {})],
+)
+def test_dimensions_are_only_sent_to_models_that_accept_them(cfg, model, expected, monkeypatch):
+    cfg = replace(cfg, embedding_model=model, embedding_dimensions=256)
+    sent = []
+
+    class RecordingAsyncOpenAI(FakeAsyncOpenAI):
+        async def create(self, model, input, **options):
+            sent.append(options)
+            return await super().create(model, input, **options)
+
+    monkeypatch.setattr(embedding, "AsyncOpenAI", RecordingAsyncOpenAI)
+    client = EmbeddingClient(cfg)
+    client.embed_texts(["chunk"])
+    client.embed_texts_batch(["chunk"])
+    upload = next(iter(client.client.uploads.values()))
+
+    assert sent == [expected]
+    assert {key: value for key, value in upload[0]["body"].items() if key == "dimensions"} == expected
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+from dataclasses import replace
+from pathlib import Path
+
+import orjson
+import pytest
+
+from ambedkar_chatbot import ingest
+from ambedkar_chatbot.vector_store import VectorStore
+
+from .conftest import make_chunks
+
+
+def test_packed_metadata_round_trips_through_lookup(cfg, data_dir, build_store):
+    chunks = make_chunks(37)
+    build_store(chunks)
+
+    store = VectorStore(cfg)
+    for idx, chunk in enumerate(chunks):
+        assert store._lookup(idx) == {
+            "int_id": idx,
+            "chunk_id": chunk.chunk_id,
+            "source": chunk.source,
+            "page": chunk.page,
+            "content": chunk.content,
+        }
+
+
+def test_jsonl_metadata_matches_packed_metadata(cfg, data_dir, build_store):
+    build_store(make_chunks(10), replace(cfg, write_jsonl_metadata=True))
+
+    packed = VectorStore(cfg)
+    ingest.METADATA_BLOB_FILE.unlink()
+    legacy = VectorStore(cfg)
+    assert [legacy._lookup(idx) for idx in range(10)] == [packed._lookup(idx) for idx in range(10)]
+
+
+@pytest.mark.parametrize("rebuild", [True, False])
+def test_interrupted_ingest_keeps_previous_store(cfg, data_dir, build_store, monkeypatch, rebuild):
+    build_store(make_chunks(12))
+
+    def snapshot() -> dict:
+        # Staged files and the embedding checkpoint are meant to outlive an interrupted run.
+        return {
+            path.name: path.read_bytes()
+            for path in data_dir.iterdir()
+            if path.suffix != ".tmp" and path != ingest.EMBED_CHECKPOINT_FILE
+        }
+
+    before = snapshot()
+
+    def fail(self, path, count):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(ingest._IndexWriter, "save", fail)
+    with pytest.raises(KeyboardInterrupt):
+        build_store(make_chunks(20), rebuild=rebuild)
+
+    assert snapshot() == before
+    assert VectorStore(cfg).vector_count == 12
+
+
+def _extract_from_bytes(pdf_path, chunk_size, overlap):
+    # Module-level so the extraction pool can pickle it.
+    text = pdf_path.read_text()
+    return [ingest.Chunk(f"{pdf_path.stem}_p1_c1", text, pdf_path.name, 1)], []
+
+
+def _extract_unavailable(pdf_path, chunk_size, overlap):
+    raise AssertionError(f"{pdf_path.name} should have been served from the chunk cache")
+
+
+def _iter_chunks(cfg):
+    return [(chunk.source, chunk.content) for chunk in ingest._iter_pdf_chunks(cfg)]
+
+
+def test_chunk_cache_skips_unchanged_pdfs(cfg, data_dir, monkeypatch):
+    pdf_dir = data_dir / "pdfs"
+    pdf_dir.mkdir()
+    (pdf_dir / "vol1.pdf").write_text("first volume")
+    (pdf_dir / "vol2.pdf").write_text("second volume")
+    monkeypatch.setattr(ingest, "PDF_DIR", pdf_dir)
+    cfg = replace(cfg, extract_workers=1)
+
+    monkeypatch.setattr(ingest, "_extract_pdf", _extract_from_bytes)
+    first = _iter_chunks(cfg)
+    assert first == [("vol1.pdf", "first volume"), ("vol2.pdf", "second volume")]
+
+    monkeypatch.setattr(ingest, "_extract_pdf", _extract_unavailable)
+    assert _iter_chunks(cfg) == first
+
+    # Editing a PDF invalidates its entry, and the stale entry is pruned.
+    (pdf_dir / "vol2.pdf").write_text("second volume, revised")
+    monkeypatch.setattr(ingest, "_extract_pdf", _extract_from_bytes)
+    assert _iter_chunks(cfg)[1] == ("vol2.pdf", "second volume, revised")
+    assert len(list(ingest.CHUNK_CACHE_DIR.glob("vol2.*.chunks"))) == 1
+
+
+def test_chunk_cache_prune_spares_pdfs_with_longer_stems(data_dir, cfg):
+    ingest.CHUNK_CACHE_DIR.mkdir()
+    other = ingest.CHUNK_CACHE_DIR / f"vol.1.{'a' * 16}.chunks"
+    stale = ingest.CHUNK_CACHE_DIR / f"vol.{'b' * 16}.chunks"
+    other.write_bytes(b"[]")
+    stale.write_bytes(b"[]")
+
+    fresh = ingest.CHUNK_CACHE_DIR / f"vol.{'c' * 16}.chunks"
+    ingest._write_chunk_cache(Path("vol.pdf"), fresh, [])
+
+    remaining = sorted(path.name for path in ingest.CHUNK_CACHE_DIR.iterdir())
+    assert remaining == sorted([other.name, fresh.name])
+
+
+@pytest.mark.parametrize(("model", "expected"), [("text-embedding-3-small", 256), ("text-embedding-ada-002", 0)])
+def test_info_records_effective_embedding_dimensions(cfg, data_dir, build_store, model, expected):
+    build_store(make_chunks(5), replace(cfg, embedding_model=model, embedding_dimensions=256))
+
+    info = orjson.loads(ingest.INDEX_INFO_FILE.read_bytes())
+    assert info["embedding_dimensions"] == expected
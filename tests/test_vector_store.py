@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+from dataclasses import replace
+
+import numpy as np
+import orjson
+import pytest
+
+from ambedkar_chatbot import vector_store
+from ambedkar_chatbot.vector_store import VectorStore
+
+from .conftest import fake_embedding, make_chunks
+
+
+def _exact_vectors(chunks) -> np.ndarray:
+    vectors = np.asarray([fake_embedding(chunk.content) for chunk in chunks], dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize("quantization", ["int8", "none"])
+def test_rerank_matches_brute_force_cosine(cfg, data_dir, build_store, quantization):
+    chunks = make_chunks(200)
+    # Over-fetch the whole corpus so the ANN stage cannot drop a true neighbour.
+    cfg = replace(cfg, vector_quantization=quantization, rerank_factor=50)
+    build_store(chunks, cfg)
+
+    store = VectorStore(cfg)
+    info = orjson.loads(vector_store.INDEX_INFO_FILE.read_bytes())
+    assert info["quant"] == quantization
+    assert store._vectors.dtype == (np.int8 if quantization == "int8" else np.float32)
+
+    exact = _exact_vectors(chunks)
+    query = np.asarray(fake_embedding("what is social democracy?"), dtype=np.float32)
+    query /= np.linalg.norm(query)
+    expected = np.argsort(-(exact @ query))[:5]
+
+    indices, similarities = store._rerank(query, top_k=5)
+    assert indices == expected.tolist()
+    np.testing.assert_allclose(similarities, (exact @ query)[expected], atol=0.02)
+
+
+def test_similarity_search_returns_nearest_chunk(cfg, data_dir, build_store):
+    chunks = make_chunks(50)
+    build_store(chunks)
+
+    results = VectorStore(cfg).similarity_search(chunks[17].content, top_k=3)
+    assert results[0].chunk_id == chunks[17].chunk_id
+    assert results[0].score == pytest.approx(1.0, abs=0.02)
+
+
+class _OfflineEmbeddings:
+    def create(self, **kwargs):
+        raise AssertionError("query embedding should have been served from the cache")
+
+
+def test_query_cache_round_trips_across_sessions(cfg, data_dir, build_store):
+    cfg = replace(cfg, query_cache_size=8)
+    build_store(make_chunks(20), cfg)
+
+    first = VectorStore(cfg)
+    expected = first.similarity_search("Annihilation of Caste", top_k=3)
+    first.save_query_cache()
+    assert vector_store.QUERY_CACHE_FILE.exists()
+
+    second = VectorStore(cfg)
+    second._embedder.client.embeddings = _OfflineEmbeddings()
+    # Case and spacing differences normalise to the same cache key.
+    assert second.similarity_search("  annihilation of   caste ", top_k=3) == expected
+
+
+@pytest.mark.parametrize("keep_bytes", [0, 40])
+def test_corrupt_query_cache_is_ignored(cfg, data_dir, build_store, keep_bytes):
+    cfg = replace(cfg, query_cache_size=8)
+    build_store(make_chunks(20), cfg)
+    store = VectorStore(cfg)
+    store.similarity_search("Annihilation of Caste")
+    store.save_query_cache()
+
+    # Simulate an interrupted write: an empty or truncated archive.
+    cache_file = vector_store.QUERY_CACHE_FILE
+    cache_file.write_bytes(cache_file.read_bytes()[:keep_bytes])
+
+    reopened = VectorStore(cfg)
+    assert len(reopened._query_cache) == 0
+    assert reopened.similarity_search("Annihilation of Caste")